@@ -0,0 +1,57 @@
+# cython: language_level=3, boundscheck=False, wraparound=False
+"""
+Compiled versions of the per-card hot loop of import_cards.py.
+
+import_cards.py builds this module with pyximport when Cython is installed and falls back to
+its pure-Python equivalents (build_row_getter() and encode_binary_row()) otherwise.
+"""
+
+from cpython.dict cimport PyDict_GetItem
+from cpython.object cimport PyObject
+from cpython.ref cimport Py_INCREF
+from cpython.tuple cimport PyTuple_New, PyTuple_SET_ITEM
+
+
+cdef class CardRowGetter:
+    """Callable that converts a card dictionary into a row tuple for a fixed column list."""
+
+    cdef tuple cols
+    cdef tuple transforms
+
+    def __init__(self, cols, transforms):
+        self.cols = tuple(cols)
+        # Conversion for each column position, or None to pass the value through.
+        self.transforms = tuple(transforms.get(col) for col in self.cols)
+
+    def __call__(self, dict card):
+        cdef Py_ssize_t i
+        cdef Py_ssize_t n = len(self.cols)
+        cdef PyObject *found
+        cdef tuple row = PyTuple_New(n)
+        for i in range(n):
+            found = PyDict_GetItem(card, self.cols[i])
+            val = <object>found if found is not NULL else None
+            transform = self.transforms[i]
+            if transform is not None:
+                val = transform(val)
+            Py_INCREF(val)
+            PyTuple_SET_ITEM(row, i, val)
+        return row
+
+
+# Length word that marks a NULL field.
+cdef bytes NULL_FIELD = b"\xff\xff\xff\xff"
+
+
+def encode_binary_row(tuple row, list encoders):
+    """Encode a row tuple as one tuple of COPY's binary format."""
+    cdef Py_ssize_t i
+    cdef Py_ssize_t n = len(row)
+    cdef list fields = [bytes(((n >> 8) & 0xFF, n & 0xFF))]
+    for i in range(n):
+        val = row[i]
+        if val is None:
+            fields.append(NULL_FIELD)
+        else:
+            fields.append(encoders[i](val))
+    return b"".join(fields)
@@ -3,27 +3,80 @@
 Import Scryfall bulk card data into a PostgreSQL database and import set information from Scryfall.
 
 This script downloads the specified bulk card data (oracle_cards, unique_artwork, or all_prints) from Scryfall,
-processes the JSON with low memory overhead using ijson, and performs a bulk UPSERT into the PostgreSQL
-database using the unique Scryfall card 'id' as the primary key.
+processes the cards in parallel worker processes (or parses the JSON with simdjson/ijson in a
+single process), streams the rows into an UNLOGGED staging table with COPY, and merges them
+server-side into the PostgreSQL database using the unique Scryfall card 'id' (or, with --pk, the
+'oracle_id') as the key.
+The cards columns are read from mtg-database/init.sql (or the file given with --columns-from).
 
 It also downloads the sets data from Scryfall and upserts that data into a new "sets" table using the set's "id" as the primary key.
 """
 
-import os
+import argparse
 import decimal
-from datetime import datetime, timezone
+import json
+import mmap
+import multiprocessing
+import os
+import re
+import struct
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+from email.utils import formatdate
+from itertools import islice
 
 import requests
 import psycopg2
 import psycopg2.extras
-import ijson
 from dotenv import load_dotenv
 
+# Prefer ijson's C backend, then the CFFI binding to libyajl, then the pure-Python default.
+try:
+    import ijson.backends.yajl2_c as ijson
+except ImportError:
+    try:
+        import ijson.backends.yajl2_cffi as ijson
+    except ImportError:
+        import ijson
+
+# simdjson (optional, pip install pysimdjson) parses the whole document at once and is used for
+# files up to SIMDJSON_MAX_BYTES when it is installed.
+try:
+    import simdjson
+except ImportError:
+    simdjson = None
+
+# Compiled versions of the per-card hot loop (_process.pyx), built on first import when
+# Cython is installed (optional, pip install cython). The .pyx import hook is removed again
+# right after, so it does not affect any later import.
+try:
+    import pyximport
+except ImportError:
+    _process = None
+else:
+    PYX_IMPORTERS = pyximport.install(language_level=3)
+    try:
+        import _process
+    except ImportError:
+        _process = None
+    finally:
+        pyximport.uninstall(*PYX_IMPORTERS)
+
+# orjson serializes the JSONB payloads in C and is used whenever it is installed.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # ---------------------------
 # CONFIGURATION
 # ---------------------------
-# Set the bulk data type here: "oracle_cards", "unique_artwork", or "all_prints"
-BULK_DATA_TYPE = "all_prints"  # Change this to the desired option
+# Supported bulk data types and the default one; choose another with --bulk-type.
+BULK_DATA_TYPES = ("oracle_cards", "unique_artwork", "all_prints")
+BULK_DATA_TYPE = "all_prints"
 
 # Define allowed layout values so we can validate card data.
 ALLOWED_LAYOUTS = {
@@ -41,90 +94,21 @@ DB_NAME = os.getenv("POSTGRES_DB")
 DB_HOST = os.getenv("POSTGRES_HOST", "localhost")
 DB_PORT = os.getenv("POSTGRES_PORT", "5432")
 
-# Connect to PostgreSQL
-conn = psycopg2.connect(
-    dbname=DB_NAME,
-    user=DB_USER,
-    password=DB_PASSWORD,
-    host=DB_HOST,
-    port=DB_PORT
-)
-cursor = conn.cursor()
+# Number of worker processes that parse and encode cards; 1 disables the parallel path.
+WORKER_PROCESSES = os.cpu_count() or 1
+# Size of the byte ranges handed to the workers, and how many may be in flight at once.
+# Together they bound the memory held by encoded rows that have not been sent yet.
+CARD_RANGE_BYTES = 8 << 20
+MAX_PENDING_RANGES = 2 * WORKER_PROCESSES
 
 # ---------------------------
 # TABLE SCHEMAS AND COLUMNS
 # ---------------------------
-# List of columns for the cards table exactly matching the updated init.sql table definition.
-columns = [
-    "oracle_id",  # stored as a regular field
-    "id",         # unique Scryfall card id (PRIMARY KEY)
-    "object",
-    "multiverse_ids",
-    "mtgo_id",
-    "tcgplayer_id",
-    "cardmarket_id",
-    "name",
-    "lang",
-    "released_at",
-    "uri",
-    "scryfall_uri",
-    "layout",
-    "highres_image",
-    "image_status",
-    "image_uris",
-    "mana_cost",
-    "cmc",
-    "type_line",
-    "oracle_text",
-    "power",
-    "toughness",
-    "colors",
-    "color_identity",
-    "keywords",
-    "legalities",
-    "games",
-    "reserved",
-    "game_changer",
-    "foil",
-    "nonfoil",
-    "finishes",
-    "oversized",
-    "promo",
-    "reprint",
-    "variation",
-    "set_id",
-    "set",
-    "set_name",
-    "set_type",
-    "set_uri",
-    "set_search_uri",
-    "scryfall_set_uri",
-    "rulings_uri",
-    "prints_search_uri",
-    "collector_number",
-    "digital",
-    "rarity",
-    "watermark",
-    "flavor_text",
-    "card_back_id",
-    "artist",
-    "artist_ids",
-    "illustration_id",
-    "border_color",
-    "frame",
-    "frame_effects",
-    "security_stamp",
-    "full_art",
-    "textless",
-    "booster",
-    "story_spotlight",
-    "edhrec_rank",
-    "preview",
-    "prices",
-    "related_uris",
-    "purchase_uris",
-    "card_faces"
-]
+# Schema file the cards columns are read from, and the column staged cards are matched on
+# when they are merged into cards. Both can be overridden on the command line.
+SCHEMA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mtg-database", "init.sql")
+KEY_COLUMNS = ("id", "oracle_id")
+KEY_COLUMN = "id"
 
 # Columns for the new sets table.
 set_columns = [
@@ -144,6 +128,31 @@ set_columns = [
     "icon_svg_uri"
 ]
 
+# simdjson builds the whole document in memory (several times the file size), so only files up
+# to this size are parsed with it; larger ones are streamed with ijson, which keeps memory flat.
+SIMDJSON_MAX_BYTES = 64 << 20
+
+# Size of the chunks written to disk while streaming the bulk JSON download.
+DOWNLOAD_CHUNK_SIZE = 1 << 20
+
+# Name of the UNLOGGED staging table that card rows are COPYed into before the merge.
+STAGE_TABLE = "cards_stage"
+
+# Drop the secondary cards indexes before the merge and rebuild them afterwards (--rebuild-indexes).
+# Every row is rewritten on each run, so one bulk build is cheaper than maintaining the indexes
+# per row, but DROP INDEX locks cards ACCESS EXCLUSIVE until the load commits, blocking readers
+# for the whole merge. Off by default so the merge only takes row locks.
+REBUILD_CARD_INDEXES = False
+# maintenance_work_mem for the load transaction, used by the index rebuilds.
+LOAD_MAINTENANCE_WORK_MEM = "1GB"
+
+# Longest single-card line accepted when checking for the one-card-per-line layout.
+MAX_CARD_LINE_BYTES = 1 << 20
+
+# Bytes read from the producer pipe per COPY message, and how often to report progress.
+COPY_READ_SIZE = 1 << 16
+PROGRESS_INTERVAL = 10000
+
 # ---------------------------
 # HELPER FUNCTIONS
 # ---------------------------
@@ -151,78 +160,565 @@ def parse_date(date_str):
     """Convert an ISO date string to a date object; return None if invalid."""
     if not date_str:
         return None
+    # Fast path for the plain YYYY-MM-DD strings Scryfall uses.
+    if len(date_str) == 10 and date_str[4] == "-" and date_str[7] == "-":
+        try:
+            return date(int(date_str[0:4]), int(date_str[5:7]), int(date_str[8:10]))
+        except ValueError:
+            return None
     try:
         return datetime.fromisoformat(date_str).date()
     except ValueError:
         return None
 
-def convert_decimals(obj):
+def build_row_getter(cols, transforms):
+    """
+    Generate a function that converts a card dictionary directly into a row tuple for cols.
+    transforms maps a column name to the conversion applied to its value. The column list is
+    fixed, so the lookups and conversions are unrolled into a single tuple expression instead
+    of looping over the columns for every card.
+    """
+    namespace = {}
+    fields = []
+    for col in cols:
+        if col in transforms:
+            name = f"transform_{len(namespace)}"
+            namespace[name] = transforms[col]
+            fields.append(f"{name}(get({col!r}))")
+        else:
+            fields.append(f"get({col!r})")
+    source = (
+        "def card_row(card):\n"
+        "    get = card.get\n"
+        f"    return ({', '.join(fields)},)\n"
+    )
+    exec(source, namespace)  # pylint: disable=exec-used
+    return namespace["card_row"]
+
+# Card columns that hold ISO date strings, and the per-column conversions applied while
+# building a card row.
+DATE_COLUMNS = {"released_at"}
+CARD_TRANSFORMS = dict.fromkeys(DATE_COLUMNS, parse_date)
+
+# Matches one column definition line of a CREATE TABLE body: the column name and its type.
+COLUMN_DEFINITION = re.compile(r"^\s*(\w+)\s+(\w+)")
+TABLE_CONSTRAINT_KEYWORDS = {"CONSTRAINT", "PRIMARY", "UNIQUE", "FOREIGN", "CHECK", "EXCLUDE"}
+
+def load_card_columns(schema_file):
+    """
+    Read the column names of the cards table, in table order, from the CREATE TABLE statement
+    in schema_file (init.sql), so the importer always follows the schema it is run against.
+    """
+    with open(schema_file, encoding="utf-8") as f:
+        schema = f.read()
+    table = re.search(r"CREATE TABLE cards \((.*?)\n\);", schema, re.DOTALL | re.IGNORECASE)
+    if not table:
+        raise RuntimeError(f"No CREATE TABLE cards statement found in {schema_file}")
+    card_columns = []
+    for line in table.group(1).splitlines():
+        definition = COLUMN_DEFINITION.match(line.split("--", 1)[0])
+        if definition and definition.group(1).upper() not in TABLE_CONSTRAINT_KEYWORDS:
+            card_columns.append(definition.group(1))
+    return card_columns
+
+# Columns of the cards table, the column the merge matches on and its position in a row, and
+# the row builder for the columns. Set by configure_card_columns().
+# pylint: disable=invalid-name
+columns = []
+key_column = KEY_COLUMN
+key_index = None
+card_row = None
+# pylint: enable=invalid-name
+
+if orjson is not None:
+    dump_json = orjson.dumps  # pylint: disable=no-member
+    load_json = orjson.loads  # pylint: disable=no-member
+else:
+    def dump_json(val):
+        """Serialize a JSONB value to UTF-8 bytes with the standard library."""
+        return json.dumps(val).encode("utf-8")
+    load_json = json.loads
+
+# ---------------------------
+# COPY BINARY ENCODING
+# ---------------------------
+# Stream header (signature, flags, header extension length), trailer, and the NULL field marker.
+COPY_BINARY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack("!ii", 0, 0)
+COPY_BINARY_TRAILER = struct.pack("!h", -1)
+COPY_BINARY_NULL = struct.pack("!i", -1)
+PG_EPOCH_ORDINAL = date(2000, 1, 1).toordinal()
+PG_EPOCH = datetime(2000, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+NUMERIC_NEG = 0x4000
+
+def encode_numeric(val):
+    """Encode a finite number in PostgreSQL's binary NUMERIC format (base-10000 digits)."""
+    sign, digits, exponent = decimal.Decimal(str(val)).as_tuple()
+    if not isinstance(exponent, int):
+        raise ValueError(f"Cannot store non-finite value {val!r} in a NUMERIC column")
+    dscale = max(0, -exponent)
+    # Align the digits so the decimal point falls on a base-10000 digit boundary.
+    text = "".join(map(str, digits)) + "0" * (exponent % 4)
+    exponent -= exponent % 4
+    text = "0" * (-len(text) % 4) + text
+    groups = [int(text[i:i + 4]) for i in range(0, len(text), 4)]
+    weight = len(groups) - 1 + exponent // 4
+    while groups and groups[0] == 0:
+        groups.pop(0)
+        weight -= 1
+    while groups and groups[-1] == 0:
+        groups.pop()
+    if not groups:
+        weight = 0
+    header = struct.pack("!hhHH", len(groups), weight, NUMERIC_NEG if sign else 0, dscale)
+    return header + struct.pack(f"!{len(groups)}H", *groups)
+
+# Length-prefixed field layouts for the fixed-width types.
+INT16 = struct.Struct("!h")
+INT32 = struct.Struct("!i")
+INT4_FIELD = struct.Struct("!ii")
+INT2_FIELD = struct.Struct("!ih")
+INT8_FIELD = struct.Struct("!iq")
+FLOAT4_FIELD = struct.Struct("!if")
+FLOAT8_FIELD = struct.Struct("!id")
+UUID_FIELD_PREFIX = INT32.pack(16)
+BOOL_FIELDS = (INT32.pack(1) + b"\x00", INT32.pack(1) + b"\x01")
+
+def encode_text(val):
+    """Encode a text (or enum label) field."""
+    data = str(val).encode("utf-8")
+    return INT32.pack(len(data)) + data
+
+def encode_jsonb(val):
+    """Encode a jsonb field: the format version byte followed by the JSON text."""
+    data = dump_json(val)
+    return INT32.pack(len(data) + 1) + b"\x01" + data
+
+def encode_json(val):
+    """Encode a json field: the JSON text."""
+    data = dump_json(val)
+    return INT32.pack(len(data)) + data
+
+def encode_date_field(val):
+    """Encode a date field; ISO date strings are parsed first and invalid ones stored as NULL."""
+    if isinstance(val, str):
+        val = parse_date(val)
+        if val is None:
+            return COPY_BINARY_NULL
+    return INT4_FIELD.pack(4, val.toordinal() - PG_EPOCH_ORDINAL)
+
+def encode_numeric_field(val):
+    """Encode a numeric field."""
+    data = encode_numeric(val)
+    return INT32.pack(len(data)) + data
+
+def encode_timestamp_field(val, as_utc=False):
+    """
+    Encode a timestamp field as microseconds since 2000-01-01; val is a datetime or an ISO 8601
+    string. For timestamptz (as_utc) aware values are converted to UTC and naive ones are taken
+    as UTC; for timestamp any UTC offset is ignored, as in PostgreSQL's text input.
+    """
+    if isinstance(val, str):
+        val = datetime.fromisoformat(val.replace("Z", "+00:00"))
+    if as_utc and val.tzinfo is not None:
+        val = val.astimezone(timezone.utc)
+    return INT8_FIELD.pack(8, (val.replace(tzinfo=None) - PG_EPOCH) // MICROSECOND)
+
+# Field encoders keyed by PostgreSQL type name; enum labels and varchar/char values are sent like
+# text, and array types are not supported. Each returns the complete field including its length,
+# so fixed-width types take a single pack() call.
+BINARY_ENCODERS = {
+    "uuid": lambda val: UUID_FIELD_PREFIX + uuid.UUID(val).bytes,
+    "text": encode_text,
+    "varchar": encode_text,
+    "bpchar": encode_text,
+    "enum": encode_text,
+    "int2": lambda val: INT2_FIELD.pack(2, val),
+    "int4": lambda val: INT4_FIELD.pack(4, val),
+    "int8": lambda val: INT8_FIELD.pack(8, val),
+    "float4": lambda val: FLOAT4_FIELD.pack(4, val),
+    "float8": lambda val: FLOAT8_FIELD.pack(8, val),
+    "bool": lambda val: BOOL_FIELDS[bool(val)],
+    "date": encode_date_field,
+    "timestamp": encode_timestamp_field,
+    "timestamptz": lambda val: encode_timestamp_field(val, as_utc=True),
+    "json": encode_json,
+    "jsonb": encode_jsonb,
+    "numeric": encode_numeric_field,
+}
+
+def load_column_types(cursor):
+    """
+    Look up the PostgreSQL type of every card column in the staging table, in columns order,
+    so the binary encoders always match the live schema.
+    """
+    cursor.execute(
+        """
+        SELECT a.attname, t.typname, t.typtype
+        FROM pg_attribute a JOIN pg_type t ON t.oid = a.atttypid
+        WHERE a.attrelid = %s::regclass AND a.attnum > 0 AND NOT a.attisdropped
+        """,
+        (STAGE_TABLE,),
+    )
+    types = {name: "enum" if typtype == "e" else typname
+             for name, typname, typtype in cursor.fetchall()}
+    missing = [col for col in columns if col not in types]
+    if missing:
+        raise RuntimeError(f"cards table has no column(s) {', '.join(missing)}; "
+                           "is the database older than the schema file?")
+    return tuple(types[col] for col in columns)
+
+def get_row_encoders(column_types):
+    """Resolve the field encoder for each column once, so rows need no per-value type checks."""
+    missing = [typ for typ in column_types if typ not in BINARY_ENCODERS]
+    if missing:
+        raise RuntimeError(f"No binary COPY encoder for column types: {', '.join(missing)}")
+    return [BINARY_ENCODERS[typ] for typ in column_types]
+
+def encode_binary_row(row, encoders):
+    """Encode a row tuple as one tuple of COPY's binary format."""
+    fields = [
+        COPY_BINARY_NULL if val is None else encode(val) for val, encode in zip(row, encoders)
+    ]
+    return INT16.pack(len(row)) + b"".join(fields)
+
+# Prefer the compiled encoder when _process.pyx could be built.
+if _process is not None:
+    encode_binary_row = _process.encode_binary_row
+
+def configure_card_columns(card_columns, key):
     """
-    Recursively convert Decimal objects to float within dictionaries or lists.
-    This helper method ensures that all decimal.Decimal instances in our card data are
-    converted to float.
+    Set the card columns and the merge key used to build, COPY and merge card rows.
+    Called by main() and, as the pool initializer, in every worker process.
     """
-    if isinstance(obj, decimal.Decimal):
-        return float(obj)
-    elif isinstance(obj, dict):
-        return {k: convert_decimals(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        return [convert_decimals(item) for item in obj]
+    global columns, key_column, key_index, card_row  # pylint: disable=global-statement
+    if key not in card_columns:
+        raise RuntimeError(f"Key column {key!r} is not a cards column")
+    columns = list(card_columns)
+    key_column = key
+    key_index = columns.index(key)
+    # Prefer the compiled row builder when _process.pyx could be built.
+    if _process is not None:
+        card_row = _process.CardRowGetter(columns, CARD_TRANSFORMS)
     else:
-        return obj
+        card_row = build_row_getter(columns, CARD_TRANSFORMS)
+
+@contextmanager
+def map_json_file(json_file):
+    """
+    Memory-map json_file read-only and tell the kernel it will be read sequentially, so it
+    can read ahead aggressively and drop pages behind the parser.
+    """
+    with open(json_file, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if hasattr(mm, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL"):
+            mm.madvise(mmap.MADV_SEQUENTIAL)
+        yield mm
+
+def iter_cards(json_file):
+    """
+    Yield each card in the bulk JSON file as a dictionary.
+    Uses simdjson to parse the whole document when available and the file is at most
+    SIMDJSON_MAX_BYTES, otherwise streams the cards with ijson. Both read the file through a
+    memory map.
+    """
+    with map_json_file(json_file) as mm:
+        if simdjson is not None and len(mm) <= SIMDJSON_MAX_BYTES:
+            parser = simdjson.Parser()
+            for card in parser.parse(mm):
+                yield card.as_dict()
+            return
+        yield from ijson.items(mm, 'item', use_float=True)
+
+def parse_card_line(line):
+    """
+    Parse one line of a bulk JSON file that holds a single card per line.
+    Strips the surrounding whitespace, the separating comma and the array brackets;
+    returns None for lines that contain no card.
+    """
+    line = line.strip().rstrip(b",")
+    if line[:1] == b"[":
+        line = line[1:].lstrip()
+    if line[-1:] == b"]":
+        line = line[:-1].rstrip().rstrip(b",")
+    if not line:
+        return None
+    return load_json(line)
+
+def find_card_ranges(json_file, count):
+    """
+    Split json_file into roughly count byte ranges that each start and end on a line boundary.
+    Scryfall writes every card of the bulk array on its own line, so each range holds whole
+    cards. Returns None when the file does not use that layout (the first card must parse on
+    its own), in which case the caller falls back to parsing the whole document.
+    """
+    size = os.path.getsize(json_file)
+    with open(json_file, "rb") as f:
+        for _ in range(2):
+            line = f.readline(MAX_CARD_LINE_BYTES)
+            if not line.endswith(b"\n"):
+                return None
+            try:
+                card = parse_card_line(line)
+            except ValueError:
+                return None
+            if card is not None:
+                break
+        if not isinstance(card, dict):
+            return None
+        offsets = [0]
+        for i in range(1, count):
+            f.seek(max(size * i // count, offsets[-1]))
+            f.readline()
+            offsets.append(f.tell())
+    offsets.append(size)
+    return [(json_file, start, end) for start, end in zip(offsets, offsets[1:]) if end > start]
 
 # ---------------------------
 # CARD PROCESSING FUNCTIONS
 # ---------------------------
 def process_card(card):
     """
-    Process a card JSON object for database insertion.
+    Process a card JSON object for database insertion and return its row tuple.
     - Converts released_at to a date.
     - Aggregates image_uris from card_faces if missing at top-level.
     - Validates the layout value against ALLOWED_LAYOUTS.
-    - Wraps dictionaries/lists in psycopg2.extras.Json for JSONB columns.
-    - Converts Decimal objects to float.
     """
     # Validate layout value.
     layout = card.get("layout")
     if layout not in ALLOWED_LAYOUTS:
         print(f"Warning: Unexpected layout '{layout}' encountered for card {card.get('name')}.")
     
-    # Aggregate image_uris if missing but present in card_faces.
-    if "card_faces" in card and not card.get("image_uris"):
-        aggregated = []
-        for face in card["card_faces"]:
-            if "image_uris" in face:
-                aggregated.append(face["image_uris"])
+    # Aggregate image_uris if missing but present in card_faces. Single-faced cards, the
+    # common case, only pay for the one card_faces lookup.
+    faces = card.get("card_faces")
+    if faces and not card.get("image_uris"):
+        aggregated = [face["image_uris"] for face in faces if "image_uris" in face]
         if aggregated:
             card["image_uris"] = aggregated
 
-    processed = {}
-    for col in columns:
-        val = card.get(col)
-        if col == "released_at":
-            processed[col] = parse_date(val)
-        else:
-            if isinstance(val, decimal.Decimal):
-                processed[col] = float(val)
-            elif isinstance(val, (dict, list)):
-                processed[col] = psycopg2.extras.Json(convert_decimals(val))
-            else:
-                processed[col] = val
-    return processed
+    return card_row(card)
 
-def upsert_batch(data_batch):
-    """Execute the UPSERT for a batch of card rows."""
-    update_columns = [col for col in columns if col != "id"]
-    set_clause = ", ".join(f"{col} = EXCLUDED.{col}" for col in update_columns)
-    sql = f"""
-    INSERT INTO cards ({', '.join(columns)}) VALUES %s
-    ON CONFLICT (id) DO UPDATE SET {set_clause}
+def encode_card_rows(cards, encoders):
     """
-    psycopg2.extras.execute_values(
-        cursor, sql, data_batch, template=None, page_size=1000
+    Process cards and yield each row encoded in COPY's binary format.
+    Cards without a value for the key column are skipped with a warning.
+    """
+    for card in cards:
+        row = process_card(card)
+        if not row[key_index]:
+            print(f"Warning: card missing '{key_column}', skipping {card.get('name')}")
+            continue
+        yield encode_binary_row(row, encoders)
+
+def encode_card_range(card_range):
+    """
+    Worker process entry point: parse and encode the cards in one
+    (json_file, start, end, column_types) byte range. Returns the number of rows and their
+    COPY binary data.
+    """
+    json_file, start, end, column_types = card_range
+    with map_json_file(json_file) as mm:
+        data = mm[start:end]
+    cards = filter(None, map(parse_card_line, data.splitlines()))
+    rows = list(encode_card_rows(cards, get_row_encoders(column_types)))
+    return len(rows), b"".join(rows)
+
+def create_stage_table(cursor):
+    """(Re)create the UNLOGGED staging table with the same columns as the cards table."""
+    cursor.execute(f"DROP TABLE IF EXISTS {STAGE_TABLE}")
+    cursor.execute(f"CREATE UNLOGGED TABLE {STAGE_TABLE} (LIKE cards INCLUDING DEFAULTS)")
+    cursor.connection.commit()
+
+def drop_stage_table(cursor):
+    """Remove the staging table once the import is finished."""
+    cursor.execute(f"DROP TABLE IF EXISTS {STAGE_TABLE}")
+    cursor.connection.commit()
+
+def stream_cards_to_fd(write_fd, json_file, encoders):
+    """
+    Single-process producer for the card COPY pipeline, run in a worker thread.
+    Parses and processes every card in json_file and writes the rows to write_fd in COPY's
+    binary format. The descriptor is always closed, even on error, which ends the COPY.
+    Returns the number of rows written.
+    """
+    total_count = 0
+    try:
+        with os.fdopen(write_fd, "wb", closefd=False) as pipe:
+            pipe.write(COPY_BINARY_HEADER)
+            for row in encode_card_rows(iter_cards(json_file), encoders):
+                pipe.write(row)
+                total_count += 1
+                if total_count % PROGRESS_INTERVAL == 0:
+                    print(f"Streamed {total_count} cards to the database...")
+            pipe.write(COPY_BINARY_TRAILER)
+    finally:
+        os.close(write_fd)
+    return total_count
+
+def stream_card_ranges_to_fd(write_fd, pool, card_ranges):
+    """
+    Parallel producer for the card COPY pipeline, run in a worker thread.
+    The pool's processes encode the card ranges and their output is written to write_fd in
+    file order. The descriptor is always closed, even on error, which ends the COPY.
+    Returns the number of rows written.
+    """
+    total_count = 0
+    try:
+        with os.fdopen(write_fd, "wb", closefd=False) as pipe:
+            pipe.write(COPY_BINARY_HEADER)
+            results = imap_bounded(pool, encode_card_range, card_ranges, MAX_PENDING_RANGES)
+            for count, block in results:
+                pipe.write(block)
+                if (total_count + count) // PROGRESS_INTERVAL > total_count // PROGRESS_INTERVAL:
+                    print(f"Streamed {total_count + count} cards to the database...")
+                total_count += count
+            pipe.write(COPY_BINARY_TRAILER)
+    finally:
+        os.close(write_fd)
+    return total_count
+
+def imap_bounded(pool, func, iterable, window):
+    """
+    Like pool.imap(), but with at most window tasks submitted and not yet consumed, so
+    results cannot pile up in memory when the consumer is slower than the workers.
+    """
+    items = iter(iterable)
+    pending = deque(pool.apply_async(func, (item,)) for item in islice(items, window))
+    while pending:
+        result = pending.popleft().get()
+        for item in islice(items, 1):
+            pending.append(pool.apply_async(func, (item,)))
+        yield result
+
+def copy_cards_to_stage(cursor, json_file):
+    """
+    COPY every card in json_file into the staging table. Returns the number of rows copied.
+    Cards are encoded by a pool of worker processes when the file has one card per line,
+    otherwise by a single parser. Either way the encoding runs alongside the COPY.
+    """
+    column_types = load_column_types(cursor)
+    # Resolve the encoders before any pipe or pool exists, so an unsupported column type
+    # fails here instead of inside a producer.
+    encoders = get_row_encoders(column_types)
+    card_ranges = None
+    if WORKER_PROCESSES > 1:
+        range_count = -(-os.path.getsize(json_file) // CARD_RANGE_BYTES)
+        card_ranges = find_card_ranges(json_file, max(range_count, WORKER_PROCESSES))
+    if card_ranges is None:
+        return run_copy_pipeline(cursor, stream_cards_to_fd, json_file, encoders)
+    print(f"Encoding cards with {WORKER_PROCESSES} worker processes...")
+    card_ranges = [card_range + (column_types,) for card_range in card_ranges]
+    # Start the pool from this thread, before the producer thread exists.
+    with multiprocessing.Pool(
+        WORKER_PROCESSES, initializer=configure_card_columns, initargs=(columns, key_column)
+    ) as pool:
+        return run_copy_pipeline(cursor, stream_card_ranges_to_fd, pool, card_ranges)
+
+def run_copy_pipeline(cursor, producer_fn, *args):
+    """
+    Run producer_fn(write_fd, *args) in a thread that writes COPY data into a pipe while
+    this thread feeds the read end to the server, so encoding overlaps with the network
+    transfer and only the pipe buffer is held here. Returns the producer's row count.
+    The producer must close write_fd even when it fails, or the COPY never sees the end of
+    its input.
+    """
+    read_fd, write_fd = os.pipe()
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        producer = executor.submit(producer_fn, write_fd, *args)
+        # Closing the read end on error makes the producer fail with BrokenPipeError
+        # instead of blocking forever on a full pipe.
+        with os.fdopen(read_fd, "rb") as pipe:
+            cursor.copy_expert(
+                f"COPY {STAGE_TABLE} ({', '.join(columns)}) FROM STDIN WITH (FORMAT binary)",
+                pipe,
+                size=COPY_READ_SIZE,
+            )
+        return producer.result()
+
+def upsert_from_stage(cursor, rebuild_indexes=REBUILD_CARD_INDEXES):
+    """
+    Merge the staging table into cards, matching rows on the key column.
+    Re-runs mostly refresh existing cards, so the merge is an UPDATE ... FROM join for the
+    cards that already exist followed by an INSERT of the remaining ones. Both are planned as
+    set-wise joins instead of the per-row speculative insert of INSERT ... ON CONFLICT.
+    Existing rows are overwritten unconditionally; an IS DISTINCT FROM guard over every column
+    (including the JSONB payloads) costs more per row than rewriting it.
+    With rebuild_indexes the secondary indexes are dropped before the merge and rebuilt
+    after it, inside the same transaction; cards is then locked against readers until the
+    load commits.
+    """
+    update_columns = [col for col in columns if col != key_column]
+    set_clause = ", ".join(f"{col} = stage.{col}" for col in update_columns)
+    column_list = ", ".join(columns)
+    update_sql = f"""
+    UPDATE cards SET {set_clause}
+    FROM {STAGE_TABLE} AS stage
+    WHERE cards.{key_column} = stage.{key_column}
+    """
+    insert_sql = f"""
+    INSERT INTO cards ({column_list})
+    SELECT {column_list} FROM {STAGE_TABLE} AS stage
+    WHERE NOT EXISTS (SELECT 1 FROM cards WHERE cards.{key_column} = stage.{key_column})
+    """
+    index_definitions = drop_card_indexes(cursor) if rebuild_indexes else []
+    cursor.execute(update_sql)
+    updated_count = cursor.rowcount
+    cursor.execute(insert_sql)
+    print(f"Updated {updated_count} existing cards and inserted {cursor.rowcount} new cards.")
+    for index_definition in index_definitions:
+        cursor.execute(index_definition)
+    cursor.connection.commit()
+
+def tune_load_transaction(cursor):
+    """
+    Relax durability and raise memory limits for the current (load) transaction only.
+    With synchronous_commit off the final COMMIT does not wait for the WAL flush; a crash
+    can lose the import but never corrupts the table, and the import can simply be re-run.
+    """
+    cursor.execute("SET LOCAL synchronous_commit = OFF")
+    cursor.execute("SET LOCAL maintenance_work_mem = %s", (LOAD_MAINTENANCE_WORK_MEM,))
+
+def check_merge_key(cursor):
+    """
+    Make sure the key column has a single-column unique (or primary key) index on cards.
+    The merge matches staged cards on it with UPDATE ... FROM and an anti-join INSERT, which,
+    unlike INSERT ... ON CONFLICT, do not enforce uniqueness themselves.
+    """
+    cursor.execute(
+        """
+        SELECT 1 FROM pg_index i
+        JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0]
+        WHERE i.indrelid = 'cards'::regclass AND i.indisunique AND i.indnkeyatts = 1
+        AND i.indpred IS NULL AND i.indexprs IS NULL AND a.attname = %s
+        """,
+        (key_column,),
     )
-    conn.commit()
+    if cursor.fetchone() is None:
+        raise RuntimeError(
+            f"cards.{key_column} has no unique index, so it cannot be used as the merge key; "
+            f"add one (CREATE UNIQUE INDEX ON cards ({key_column})) or use --pk id"
+        )
+
+def drop_card_indexes(cursor):
+    """
+    Drop the cards indexes that neither back a constraint nor are unique (the primary key and
+    any unique merge key index are kept for the joins of the merge) and return their
+    definitions so they can be recreated.
+    """
+    cursor.execute(
+        """
+        SELECT indexname, indexdef FROM pg_indexes
+        WHERE schemaname = current_schema() AND tablename = 'cards'
+        AND indexdef NOT LIKE 'CREATE UNIQUE INDEX %'
+        AND indexname NOT IN (
+            SELECT conname FROM pg_constraint WHERE conrelid = 'cards'::regclass
+        )
+        """
+    )
+    indexes = cursor.fetchall()
+    for index_name, _ in indexes:
+        cursor.execute(f'DROP INDEX "{index_name}"')
+    return [index_definition for _, index_definition in indexes]
 
 # ---------------------------
 # SETS PROCESSING FUNCTIONS
@@ -241,7 +737,7 @@ def process_set(set_data):
             processed[col] = val
     return processed
 
-def upsert_sets_batch(data_batch):
+def upsert_sets_batch(cursor, data_batch):
     """Execute the UPSERT for a batch of set rows."""
     update_columns = [col for col in set_columns if col != "id"]
     set_clause = ", ".join(f"{col} = EXCLUDED.{col}" for col in update_columns)
@@ -252,9 +748,9 @@ def upsert_sets_batch(data_batch):
     psycopg2.extras.execute_values(
         cursor, sql, data_batch, template=None, page_size=1000
     )
-    conn.commit()
+    cursor.connection.commit()
 
-def import_sets():
+def import_sets(cursor):
     """
     Downloads the sets data from Scryfall, processes each set,
     and performs a bulk UPSERT into the 'sets' table.
@@ -278,37 +774,45 @@ def import_sets():
         row = tuple(processed.get(col) for col in set_columns)
         batch.append(row)
     if batch:
-        upsert_sets_batch(batch)
+        upsert_sets_batch(cursor, batch)
         print(f"Upserted {len(batch)} sets into the database.")
 
 # ---------------------------
 # DOWNLOAD FUNCTIONS
 # ---------------------------
-def download_latest_json(json_file):
+def download_latest_json(json_file, bulk_type):
     """
     Checks the Scryfall bulk-data API for the desired JSON file.
     If the file is missing or outdated, it downloads the file.
     Supports bulk types "oracle_cards", "unique_artwork", and "all_prints".
     
-    Note: When BULK_DATA_TYPE is set to "all_prints", the script will search for the bulk data
+    Note: When bulk_type is "all_prints", the script will search for the bulk data
     object with type "all_cards" from Scryfall.
     """
     bulk_api = "https://api.scryfall.com/bulk-data"
-    print(f"Querying Scryfall bulk-data API for the latest {BULK_DATA_TYPE} JSON URL...")
+    print(f"Querying Scryfall bulk-data API for the latest {bulk_type} JSON URL...")
 
-    resp = requests.get(bulk_api, timeout=10)
+    # Ask for the listing conditionally: the local file's mtime is the server's updated_at of
+    # the last download, so a 304 means nothing newer has been published.
+    headers = {}
+    if os.path.exists(json_file):
+        headers["If-Modified-Since"] = formatdate(os.path.getmtime(json_file), usegmt=True)
+    resp = requests.get(bulk_api, headers=headers, timeout=10)
+    if resp.status_code == 304:
+        print(f"{json_file} is up-to-date (bulk-data API not modified); skipping download.")
+        return
     if resp.status_code != 200:
         raise RuntimeError(f"Failed to query bulk-data API: {resp.status_code}")
     bulk_data = resp.json().get("data", [])
 
     # Map "all_prints" to the Scryfall bulk data type "all_cards"
-    desired_type = BULK_DATA_TYPE
-    if BULK_DATA_TYPE == "all_prints":
+    desired_type = bulk_type
+    if bulk_type == "all_prints":
         desired_type = "all_cards"
 
     desired_bulk = next((item for item in bulk_data if item.get("type") == desired_type), None)
     if not desired_bulk:
-        raise RuntimeError(f"{BULK_DATA_TYPE} bulk data not found")
+        raise RuntimeError(f"{bulk_type} bulk data not found")
     
     server_updated_at = datetime.fromisoformat(
         desired_bulk.get("updated_at").replace("Z", "+00:00")
@@ -325,12 +829,23 @@ def download_latest_json(json_file):
             return
         print(f"{json_file} is outdated; downloading new version...")
 
-    r = requests.get(download_uri, timeout=10)
-    if r.status_code != 200:
-        raise RuntimeError(f"Failed to download {BULK_DATA_TYPE} JSON: {r.status_code}")
-    
-    with open(json_file, "wb") as f:
-        f.write(r.content)
+    save_download(download_uri, json_file, server_updated_at)
+
+def save_download(download_uri, json_file, server_updated_at):
+    """
+    Stream the (gzip-encoded) bulk file to json_file and set its mtime to server_updated_at.
+    The body goes to a temporary file first, so it is never held in memory and an interrupted
+    download cannot leave a truncated file that looks up-to-date.
+    """
+    part_file = f"{json_file}.part"
+    headers = {"Accept-Encoding": "gzip"}
+    with requests.get(download_uri, headers=headers, stream=True, timeout=30) as r:
+        if r.status_code != 200:
+            raise RuntimeError(f"Failed to download {json_file}: {r.status_code}")
+        with open(part_file, "wb") as f:
+            for chunk in r.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                f.write(chunk)
+    os.replace(part_file, json_file)
     mod_time = server_updated_at.timestamp()
     os.utime(json_file, (mod_time, mod_time))
     print(f"Downloaded and saved as {json_file} with mtime set to {server_updated_at.isoformat()}")
@@ -338,40 +853,61 @@ def download_latest_json(json_file):
 # ---------------------------
 # MAIN FUNCTION
 # ---------------------------
-def main():
+def connect_db():
+    """
+    Connect to PostgreSQL using the .env configuration.
+    Called from main() rather than at import time so worker processes, which import this
+    module, never open their own connections.
+    """
+    return psycopg2.connect(
+        dbname=DB_NAME,
+        user=DB_USER,
+        password=DB_PASSWORD,
+        host=DB_HOST,
+        port=DB_PORT
+    )
+
+def parse_args(argv=None):
+    """Parse the command line options."""
+    parser = argparse.ArgumentParser(
+        description="Import Scryfall bulk card data and set data into PostgreSQL."
+    )
+    parser.add_argument("--bulk-type", choices=BULK_DATA_TYPES, default=BULK_DATA_TYPE,
+                        help=f"Scryfall bulk data to import (default: {BULK_DATA_TYPE})")
+    parser.add_argument("--pk", choices=KEY_COLUMNS, default=KEY_COLUMN,
+                        help="column staged cards are matched on when merged into cards "
+                             f"(default: {KEY_COLUMN}; oracle_id suits oracle_cards)")
+    parser.add_argument("--columns-from", default=SCHEMA_FILE, metavar="INIT_SQL",
+                        help="schema file the cards columns are read from "
+                             "(default: mtg-database/init.sql)")
+    parser.add_argument("--rebuild-indexes", action="store_true", default=REBUILD_CARD_INDEXES,
+                        help="drop the secondary cards indexes during the merge and rebuild them "
+                             "afterwards; faster, but cards cannot be read until the load commits")
+    return parser.parse_args(argv)
+
+def main(argv=None):
     """Main function to download, process, and import card and set data into the database."""
+    args = parse_args(argv)
+    configure_card_columns(load_card_columns(args.columns_from), args.pk)
+
     # Import cards
-    json_file = f"scryfall-{BULK_DATA_TYPE}.json"
-    download_latest_json(json_file)
+    json_file = f"scryfall-{args.bulk_type}.json"
+    download_latest_json(json_file, args.bulk_type)
 
-    batch_size = 10000
-    batch = []
-    total_count = 0
-    print("Streaming and processing card JSON file...")
-    with open(json_file, 'rb') as f:
-        cards = ijson.items(f, 'item')
-        for card in cards:
-            processed = process_card(card)
-            # Skip any card that lacks an 'id'
-            if not processed.get("id"):
-                print(f"Warning: card missing 'id', skipping {processed.get('name')}")
-                continue
-            row = tuple(processed.get(col) for col in columns)
-            batch.append(row)
-            total_count += 1
-
-            if total_count % batch_size == 0:
-                print(f"Processing batch of {batch_size} cards (total processed: {total_count})...")
-                upsert_batch(batch)
-                batch = []
-    # Process any remaining rows for cards
-    if batch:
-        print(f"Processing final batch of {len(batch)} cards...")
-        upsert_batch(batch)
+    print("Parsing card JSON file and streaming rows into the staging table...")
+    conn = connect_db()
+    cursor = conn.cursor()
+    check_merge_key(cursor)
+    create_stage_table(cursor)
+    tune_load_transaction(cursor)
+    total_count = copy_cards_to_stage(cursor, json_file)
+    print(f"Merging {total_count} staged cards into the cards table...")
+    upsert_from_stage(cursor, args.rebuild_indexes)
+    drop_stage_table(cursor)
     print(f"Card data import complete. Total cards processed: {total_count}")
 
     # Import sets data
-    import_sets()
+    import_sets(cursor)
 
     cursor.close()
     conn.close()